@@ -7,18 +7,34 @@ Clean Architecture Implementation
 import os
 import io
 import time
+import array
+import asyncio
 import logging
+import functools
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import psutil
 from typing import Optional
 from contextlib import asynccontextmanager
 
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 from fastapi import FastAPI, File, UploadFile, HTTPException, status, Query
-from fastapi.responses import Response
-from rembg import remove, new_session
+from fastapi.responses import JSONResponse, Response
+from rembg import remove
 import uvicorn
 
+from sessions import build_session
+from batching import MaskBatcher
+from matting import GuidedMatting
+from faces import load_face_detector
+from image_io import decode_image, encode_image, read_format
+from response_cache import ResponseCache, digest_upload
+from kernels import (
+    composite_on_white, cutout, enhance_pixels, mean_luma, median_filter, warm_up as warm_up_kernels
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,19 +42,46 @@ logger = logging.getLogger(__name__)
 # Global sessions for different AI models (loaded once for performance)
 rembg_sessions = {}
 
-# Statistics tracking
-stats = {
-    "total_processed": 0,
-    "total_errors": 0,
-    "total_processing_time": 0.0,
-    "average_processing_time": 0.0,
-    "model_usage": {}
-}
+# Per-model batchers that coalesce concurrent mask predictions
+mask_batchers = {}
+
+# ONNX alpha matting used by the premium (isnet) pipeline
+alpha_matting = None
+
+# Face detector for smart crop (None when OpenCV is unavailable)
+face_detector = None
+
+# Bounded pool for CPU-bound image work (decode, resize, encode...), keeping it off the event loop
+NUM_IMAGE_THREADS = int(os.getenv("NUM_IMAGE_THREADS", "2"))
+executor = None
+
+# Separate pool for the batchers' forward passes (one thread per model), so busy models
+# never hold the workers that /enhance and /crop need for their pixel work
+inference_executor = None
+
+# Largest accepted upload (bytes), enforced while the body is received (UploadSizeLimitMiddleware)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
+
+# Longest side (px) fed to the models; larger uploads are processed on a downscaled copy
+MAX_INFERENCE_SIZE = int(os.getenv("MAX_INFERENCE_SIZE", "2048"))
+
+# Statistics tracking: flat int64 counters (processing time in ns) and per-model usage;
+# derived values such as the average are computed when /stats is read
+STAT_PROCESSED, STAT_ERRORS, STAT_PROCESSING_NS = range(3)
+stat_counts = array.array('q', [0, 0, 0])
+model_usage = collections.Counter()
+stats_lock = threading.Lock()
+
+# Monotonic time (ns) of the last successful background removal, reported by /health
+last_inference_ns = 0
+
+# Encoded responses of recent requests, keyed by upload digest and parameters
+response_cache = ResponseCache()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize and cleanup resources"""
-    global rembg_sessions
+    global rembg_sessions, mask_batchers, alpha_matting, face_detector, executor, inference_executor
     
     # Startup
     logger.info("🚀 Initializing AI Service...")
@@ -48,12 +91,12 @@ async def lifespan(app: FastAPI):
         
         # Load u2net (standard quality - faster)
         logger.info("Loading u2net model (standard quality)...")
-        rembg_sessions['u2net'] = new_session('u2net')
+        rembg_sessions['u2net'] = build_session('u2net')
         logger.info("✅ u2net model loaded!")
         
         # Load isnet-general-use (premium quality)
         logger.info("Loading isnet-general-use model (premium quality)...")
-        rembg_sessions['isnet-general-use'] = new_session('isnet-general-use')
+        rembg_sessions['isnet-general-use'] = build_session('isnet-general-use')
         logger.info("✅ isnet-general-use model loaded!")
         
         # Warm up models with dummy images
@@ -61,22 +104,37 @@ async def lifespan(app: FastAPI):
         dummy_image = Image.new('RGB', (100, 100), color='white')
         for model_name, session in rembg_sessions.items():
             _ = remove(dummy_image, session=session)
-            stats["model_usage"][model_name] = 0
+            model_usage[model_name] = 0
             logger.info(f"✅ {model_name} warmed up successfully!")
         
-        # Additional warm-up for isnet alpha matting (prevents 56s delay on first request)
-        logger.info("Warming up isnet alpha matting...")
-        _ = remove(
-            dummy_image, 
-            session=rembg_sessions['isnet-general-use'],
-            alpha_matting=True,
-            alpha_matting_foreground_threshold=240,
-            alpha_matting_background_threshold=10,
-            alpha_matting_erode_size=10,
-            post_process_mask=True
+        # Build the alpha matting graph used by isnet (trimap + guided filter in ONNX Runtime)
+        logger.info("Loading alpha matting...")
+        alpha_matting = GuidedMatting(
+            foreground_threshold=240,
+            background_threshold=10,
+            erode_size=10
         )
+        _ = alpha_matting.cutout(dummy_image, Image.new('L', dummy_image.size, 255), post_process_mask=True)
         logger.info("✅ Alpha matting warmed up successfully!")
         
+        # Load the smart crop face detector once
+        logger.info("Loading face detector...")
+        face_detector = load_face_detector()
+        if face_detector is not None:
+            logger.info("✅ Face detector loaded!")
+        
+        # Compile the Numba pixel kernels before the first request
+        logger.info("Compiling pixel kernels...")
+        warm_up_kernels()
+        logger.info("✅ Pixel kernels compiled!")
+        
+        # Start request batching for each model
+        executor = ThreadPoolExecutor(max_workers=NUM_IMAGE_THREADS, thread_name_prefix="image")
+        inference_executor = ThreadPoolExecutor(max_workers=len(rembg_sessions), thread_name_prefix="inference")
+        for model_name, session in rembg_sessions.items():
+            mask_batchers[model_name] = MaskBatcher(model_name, session, inference_executor)
+            mask_batchers[model_name].start()
+        
         logger.info(f"✅ AI Service initialized with {len(rembg_sessions)} models!")
         
     except Exception as e:
@@ -87,6 +145,11 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     logger.info("🔄 Shutting down AI Service...")
+    for batcher in mask_batchers.values():
+        await batcher.stop()
+    for pool in (inference_executor, executor):
+        if pool:
+            pool.shutdown(wait=True)
 
 # Create FastAPI app
 app = FastAPI(
@@ -96,6 +159,143 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+def upload_too_large() -> HTTPException:
+    """413 error for uploads over MAX_UPLOAD_SIZE"""
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)}MB."
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject request bodies over MAX_UPLOAD_SIZE with 413
+
+    Plain ASGI, so responses pass through without a per-request wrapper. A declared
+    Content-Length is checked before anything is read; otherwise (chunked uploads)
+    the received bytes are counted and the upload is aborted as soon as it crosses
+    the limit, instead of being spooled in full first.
+    """
+
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            error = upload_too_large()
+            response = JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Raised inside body parsing; FastAPI re-raises HTTPExceptions as they are
+                    raise upload_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware, max_size=MAX_UPLOAD_SIZE)
+
+
+def record_success(usage_key: str, processing_ns: int):
+    """Count a processed request and its processing time under a model/endpoint key"""
+    with stats_lock:
+        stat_counts[STAT_PROCESSED] += 1
+        stat_counts[STAT_PROCESSING_NS] += processing_ns
+        model_usage[usage_key] += 1
+
+
+def record_error():
+    """Count a failed request"""
+    with stats_lock:
+        stat_counts[STAT_ERRORS] += 1
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run CPU-bound work on the image thread pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def get_upload_size(upload: UploadFile) -> int:
+    """
+    Size in bytes of an uploaded file, leaving it rewound for decoding
+
+    Images are decoded straight from the spooled upload file (Image.open accepts
+    file objects) instead of copying it into bytes and again into a BytesIO.
+    The size limit is enforced earlier, while the body is received
+    (see UploadSizeLimitMiddleware).
+    """
+    file_obj = upload.file
+    file_obj.seek(0, io.SEEK_END)
+    upload_size = file_obj.tell()
+    file_obj.seek(0)
+    return upload_size
+
+
+def output_settings(output_format: str, compress_level: int, quality: int) -> tuple:
+    """Encoder settings that actually shape the output, as a cache key part"""
+    if output_format.lower() in ['jpg', 'jpeg']:
+        return ("jpeg", quality)
+    return ("png", compress_level)
+
+
+async def find_cached(file_obj, *params):
+    """
+    Look up the stored response for an upload and its parameters, returning (key, entry)
+
+    Both are None when caching is disabled, in which case the upload is not hashed.
+    """
+    if response_cache.max_entries <= 0:
+        return None, None
+    cache_key = (await run_blocking(digest_upload, file_obj), *params)
+    return cache_key, response_cache.get(cache_key)
+
+
+def cached_response(entry, start_ns: int, usage_key: str) -> Response:
+    """Build the response for a cache hit, counting it as a processed request"""
+    content, media_type, headers = entry
+    processing_ns = time.monotonic_ns() - start_ns
+    record_success(usage_key, processing_ns)
+    
+    logger.info(f"⚡ Served cached response in {processing_ns / 1e9:.2f}s")
+    
+    headers = {**headers, "X-Processing-Time": f"{processing_ns / 1e9:.2f}s", "X-Cache": "HIT"}
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def apply_cutout_alpha(original: Image.Image, cutout_image: Image.Image) -> Image.Image:
+    """Apply the alpha of a (downscaled) cutout to the full-resolution original (in place if RGBA)"""
+    alpha = cutout_image.getchannel('A').resize(original.size, Image.Resampling.BILINEAR)
+    if original.mode != 'RGBA':
+        original = original.convert('RGBA')
+    original.putalpha(alpha)
+    return original
+
+
+def open_rgb_on_white(file_obj) -> Image.Image:
+    """Decode an upload as RGB, flattening any transparency onto white"""
+    img = Image.open(file_obj)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        return composite_on_white(img.convert('RGBA'))
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    img.load()
+    return img
+
+
 def get_memory_usage():
     """Get current memory usage"""
     process = psutil.Process()
@@ -106,7 +306,7 @@ def get_memory_usage():
     }
 
 @app.get("/")
-async def root():
+async def root() -> dict:
     """Root endpoint"""
     return {
         "service": "AI Image Processing",
@@ -134,8 +334,10 @@ async def root():
     }
 
 @app.get("/health")
-async def health_check():
-    """Health check endpoint"""
+async def health_check(
+    deep: bool = Query(False, description="Also run a test inference through the model (readiness probe)")
+) -> dict:
+    """Health check endpoint (cheap liveness check; deep=true adds a real inference)"""
     global rembg_sessions
     
     try:
@@ -146,15 +348,23 @@ async def health_check():
                 detail="AI models not loaded"
             )
         
-        # Quick model test
-        test_image = Image.new('RGB', (32, 32), color='red')
-        _ = remove(test_image, session=rembg_sessions['u2net'])
+        # Cheap session sanity check (no forward pass on every probe)
+        for session in rembg_sessions.values():
+            session.inner_session.get_inputs()
+        
+        if deep:
+            # Full forward pass, only when explicitly requested
+            test_image = Image.new('RGB', (32, 32), color='red')
+            await mask_batchers['u2net'].submit(test_image)
         
         return {
             "status": "healthy",
             "loaded_models": list(rembg_sessions.keys()),
             "memory_usage": get_memory_usage(),
-            "uptime_seconds": time.time()
+            "uptime_seconds": time.time(),
+            "last_success_seconds_ago": (
+                round((time.monotonic_ns() - last_inference_ns) / 1e9, 1) if last_inference_ns else None
+            )
         }
         
     except Exception as e:
@@ -168,7 +378,10 @@ async def health_check():
 async def remove_background(
     image: UploadFile = File(...),
     model: str = Query("u2net", description="AI model to use: u2net (fast) or isnet-general-use (premium quality)"),
-    output_format: str = Query("png", description="Output format: png or jpg")
+    output_format: str = Query("png", description="Output format: png or jpg"),
+    compress_level: int = Query(1, ge=0, le=9, description="PNG compression level (0-9, lower is faster)"),
+    quality: int = Query(85, ge=40, le=100, description="JPEG quality (40-100)"),
+    hi_res: bool = Query(True, description="Return oversized images at full resolution (false returns the inference-size cutout)")
 ):
     """
     Remove background from uploaded image
@@ -177,13 +390,17 @@ async def remove_background(
         image: Uploaded image file
         model: AI model to use ('u2net' or 'isnet-general-use')
         output_format: Output format ('png' or 'jpg')
+        compress_level: PNG zlib compression level (0-9, default 1 favours speed)
+        quality: JPEG quality (40-100, default 85; 95 is near-lossless but ~40% larger)
+        hi_res: Upsample the alpha onto the full-resolution original for images larger
+            than MAX_INFERENCE_SIZE; when false the downscaled cutout is returned as is
     
     Returns:
         Processed image with transparent background (PNG) or white background (JPG)
     """
-    global rembg_sessions, stats
+    global rembg_sessions, mask_batchers, alpha_matting, last_inference_ns
     
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
         # Validate model
@@ -193,8 +410,6 @@ async def remove_background(
                 detail=f"Invalid model '{model}'. Available models: {list(rembg_sessions.keys())}"
             )
         
-        selected_session = rembg_sessions[model]
-        
         # Validate file
         if not image.content_type.startswith('image/'):
             raise HTTPException(
@@ -204,22 +419,28 @@ async def remove_background(
         
         # Read image data
         logger.info(f"📷 Processing: {image.filename} ({image.content_type}) with model: {model}")
-        image_data = await image.read()
+        upload_size = get_upload_size(image)
         
-        if len(image_data) == 0:
+        if upload_size == 0:
             raise HTTPException(
                 status_code=400,
                 detail="Empty image file"
             )
         
-        # Convert to PIL Image
+        # Same bytes with the same parameters (e.g. a gateway retry): serve the stored result
+        cache_key, cached = await find_cached(
+            image.file, "remove-background", model, hi_res,
+            *output_settings(output_format, compress_level, quality)
+        )
+        if cached is not None:
+            return cached_response(cached, start_ns, model)
+        
+        # Decode to RGB/RGBA, applying EXIF orientation up front so the mask matches the pixels
         try:
-            pil_image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if needed
-            if pil_image.mode not in ['RGB', 'RGBA']:
-                pil_image = pil_image.convert('RGB')
-                
+            # Without hi_res only the inference-size image is needed: JPEGs decode straight to it
+            pil_image, _ = await run_blocking(
+                decode_image, image.file, exif_transpose=True, max_size=None if hi_res else MAX_INFERENCE_SIZE
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=400,
@@ -232,63 +453,69 @@ async def remove_background(
         # Remove background with model-specific processing
         logger.info(f"🤖 Removing background with {model}...")
         
+        # The models run at 320²/1024² anyway: infer on a downscaled copy of huge uploads
+        original_image = pil_image
+        if max(pil_image.size) > MAX_INFERENCE_SIZE:
+            scale = MAX_INFERENCE_SIZE / max(pil_image.size)
+            inference_size = (max(1, round(pil_image.width * scale)), max(1, round(pil_image.height * scale)))
+            pil_image = await run_blocking(
+                pil_image.resize, inference_size, Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+            logger.info(f"Downscaled to {pil_image.size} for inference")
+        
+        # Predict the mask through the batcher (shared forward pass with concurrent requests)
+        mask = await mask_batchers[model].submit(pil_image)
+        
         if model == 'isnet-general-use':
             # Premium quality with alpha matting and post-processing
-            processed_image = remove(
-                pil_image, 
-                session=selected_session,
-                alpha_matting=True,
-                alpha_matting_foreground_threshold=240,
-                alpha_matting_background_threshold=10,
-                alpha_matting_erode_size=10,
+            processed_image = await run_blocking(
+                alpha_matting.cutout,
+                pil_image,
+                mask,
                 post_process_mask=True
             )
         else:
-            # Standard quality - faster processing
-            processed_image = remove(pil_image, session=selected_session)
+            # Standard quality - faster processing (plain cutout straight from the mask)
+            processed_image = await run_blocking(cutout, pil_image, mask)
         
-        # Prepare output
-        output_buffer = io.BytesIO()
-        
-        if output_format.lower() in ['jpg', 'jpeg']:
-            # For JPEG, composite with white background
-            white_bg = Image.new('RGBA', processed_image.size, (255, 255, 255, 255))
-            final_image = Image.alpha_composite(white_bg, processed_image)
-            final_image.convert('RGB').save(output_buffer, format='JPEG', quality=95)
-            media_type = "image/jpeg"
-        else:
-            # Default to PNG with transparency
-            processed_image.save(output_buffer, format='PNG', optimize=True)
-            media_type = "image/png"
+        if hi_res and original_image is not pil_image:
+            # Upsample the predicted alpha and apply it to the full-resolution original
+            processed_image = await run_blocking(apply_cutout_alpha, original_image, processed_image)
         
-        output_buffer.seek(0)
+        # Prepare output: PNG with transparency, or JPEG composited on a white background
+        output_data, media_type = await run_blocking(encode_image, processed_image, output_format, compress_level, quality)
         
         # Calculate processing time
-        processing_time = time.time() - start_time
+        processing_ns = time.monotonic_ns() - start_ns
+        processing_time = processing_ns / 1e9
         
         # Update statistics
-        stats["total_processed"] += 1
-        stats["total_processing_time"] += processing_time
-        stats["average_processing_time"] = stats["total_processing_time"] / stats["total_processed"]
-        stats["model_usage"][model] += 1
+        record_success(model, processing_ns)
+        last_inference_ns = time.monotonic_ns()
         
         logger.info(f"✅ Processed in {processing_time:.2f}s with {model}")
         
-        return Response(
-            content=output_buffer.getvalue(),
-            media_type=media_type,
-            headers={
-                "X-Processing-Time": f"{processing_time:.2f}s",
-                "X-Model-Used": model,
-                "X-Original-Size": str(len(image_data)),
-                "X-Processed-Size": str(len(output_buffer.getvalue()))
-            }
-        )
+        headers = {
+            "X-Processing-Time": f"{processing_time:.2f}s",
+            "X-Model-Used": model,
+            "X-Original-Size": str(upload_size),
+            "X-Processed-Size": str(len(output_data))
+        }
+        if media_type == "image/png":
+            # Lets clients relate the output size to the speed/size tradeoff they chose
+            headers["X-PNG-Level"] = str(compress_level)
+        else:
+            headers["X-JPEG-Quality"] = str(quality)
+        if cache_key is not None:
+            response_cache.put(cache_key, output_data, media_type, headers)
+            headers["X-Cache"] = "MISS"
+        
+        return Response(content=output_data, media_type=media_type, headers=headers)
         
     except HTTPException:
         raise
     except Exception as e:
-        stats["total_errors"] += 1
+        record_error()
         logger.error(f"❌ Processing error: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -305,7 +532,9 @@ async def enhance_image(
     sharpness: float = Query(1.0, ge=0.0, le=3.0, description="Sharpness factor (1.0 = original)"),
     auto_enhance: bool = Query(False, description="Apply automatic enhancement"),
     denoise: bool = Query(False, description="Apply noise reduction"),
-    output_format: str = Query("png", description="Output format: png or jpg")
+    output_format: str = Query("png", description="Output format: png or jpg"),
+    compress_level: int = Query(1, ge=0, le=9, description="PNG compression level (0-9, lower is faster)"),
+    quality: int = Query(85, ge=40, le=100, description="JPEG quality (40-100)")
 ):
     """
     Enhance image with brightness, contrast, saturation, sharpness adjustments.
@@ -319,13 +548,13 @@ async def enhance_image(
         auto_enhance: Apply automatic enhancement (ignores manual sliders)
         denoise: Apply noise reduction filter
         output_format: Output format ('png' or 'jpg')
+        compress_level: PNG zlib compression level (0-9, default 1 favours speed)
+        quality: JPEG quality (40-100, default 85; 95 is near-lossless but ~40% larger)
     
     Returns:
         Enhanced image
     """
-    global stats
-    
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
         # Validate file
@@ -337,19 +566,59 @@ async def enhance_image(
         
         # Read image data
         logger.info(f"🎨 Enhancing: {image.filename} ({image.content_type})")
-        image_data = await image.read()
+        upload_size = get_upload_size(image)
         
-        if len(image_data) == 0:
+        if upload_size == 0:
             raise HTTPException(
                 status_code=400,
                 detail="Empty image file"
             )
         
+        # Nothing to apply and already in the requested format: return the upload untouched.
+        # Decided from the header alone, before any pixels are decoded or converted
+        output_jpeg = output_format.lower() in ['jpg', 'jpeg']
+        no_changes = not auto_enhance and not denoise and brightness == contrast == saturation == sharpness == 1.0
+        if no_changes:
+            try:
+                upload_format = await run_blocking(read_format, image.file)
+            except Exception as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid image format: {str(e)}"
+                )
+            if upload_format == ('JPEG' if output_jpeg else 'PNG'):
+                # UploadFile.read() moves the copy off the event loop once the upload spilled to disk
+                await image.seek(0)
+                output_data = await image.read()
+                
+                processing_ns = time.monotonic_ns() - start_ns
+                processing_time = processing_ns / 1e9
+                record_success("enhance", processing_ns)
+                
+                logger.info(f"✅ No enhancements requested, returned original in {processing_time:.2f}s")
+                
+                return Response(
+                    content=output_data,
+                    media_type="image/jpeg" if output_jpeg else "image/png",
+                    headers={
+                        "X-Processing-Time": f"{processing_time:.2f}s",
+                        "X-Enhancements": "",
+                        "X-Original-Size": str(upload_size),
+                        "X-Processed-Size": str(len(output_data))
+                    }
+                )
+        
+        # Checked after the passthrough, which never pays for hashing the upload
+        cache_key, cached = await find_cached(
+            image.file, "enhance", brightness, contrast, saturation, sharpness, auto_enhance, denoise,
+            *output_settings(output_format, compress_level, quality)
+        )
+        if cached is not None:
+            return cached_response(cached, start_ns, "enhance")
+        
         # Convert to PIL Image
         try:
-            pil_image = Image.open(io.BytesIO(image_data))
-            if pil_image.mode not in ['RGB', 'RGBA']:
-                pil_image = pil_image.convert('RGB')
+            pil_image, _ = await run_blocking(decode_image, image.file)
         except Exception as e:
             raise HTTPException(
                 status_code=400,
@@ -358,17 +627,17 @@ async def enhance_image(
         
         logger.info(f"Image size: {pil_image.size}, mode: {pil_image.mode}")
         
-        enhanced = pil_image.copy()
+        # The pipeline stays one (H, W, 3|4) array from decode to encode, skipping the
+        # NumPy <-> PIL copies between steps; every step returns a new array
+        enhanced = await run_blocking(np.asarray, pil_image)
         enhancements_applied = []
         
         if auto_enhance:
             # Auto-enhance pipeline
             logger.info("🤖 Applying auto-enhancement...")
             
-            # Auto brightness: analyze histogram and adjust
-            from PIL import ImageStat
-            stat = ImageStat.Stat(enhanced.convert('L'))
-            mean_brightness = stat.mean[0]
+            # Auto brightness: analyze mean luminance and adjust
+            mean_brightness = await run_blocking(mean_luma, enhanced)
             
             # Target mean brightness ~128
             if mean_brightness < 100:
@@ -379,88 +648,73 @@ async def enhance_image(
                 brightness_factor = 1.0
             
             if brightness_factor != 1.0:
-                enhanced = ImageEnhance.Brightness(enhanced).enhance(brightness_factor)
                 enhancements_applied.append(f"brightness:{brightness_factor:.2f}")
             
-            # Auto contrast
-            enhanced = ImageEnhance.Contrast(enhanced).enhance(1.2)
-            enhancements_applied.append("contrast:1.20")
-            
-            # Auto saturation boost
-            enhanced = ImageEnhance.Color(enhanced).enhance(1.15)
-            enhancements_applied.append("saturation:1.15")
-            
-            # Auto sharpness
-            enhanced = ImageEnhance.Sharpness(enhanced).enhance(1.3)
-            enhancements_applied.append("sharpness:1.30")
+            # Auto contrast, saturation boost and sharpness (single fused pass); with no
+            # brightness change the contrast mean is the luminance measured above
+            enhanced = await run_blocking(
+                enhance_pixels, enhanced, brightness_factor, 1.2, 1.15, 1.3,
+                luma=mean_brightness if brightness_factor == 1.0 else None
+            )
+            enhancements_applied.extend(["contrast:1.20", "saturation:1.15", "sharpness:1.30"])
             
             # Light denoise via median filter
-            enhanced = enhanced.filter(ImageFilter.MedianFilter(size=3))
+            enhanced = await run_blocking(median_filter, enhanced)
             enhancements_applied.append("denoise:median")
             
         else:
-            # Manual adjustments
+            # Manual adjustments (single fused pass over the pixels)
             if brightness != 1.0:
-                enhanced = ImageEnhance.Brightness(enhanced).enhance(brightness)
                 enhancements_applied.append(f"brightness:{brightness:.2f}")
             
             if contrast != 1.0:
-                enhanced = ImageEnhance.Contrast(enhanced).enhance(contrast)
                 enhancements_applied.append(f"contrast:{contrast:.2f}")
             
             if saturation != 1.0:
-                enhanced = ImageEnhance.Color(enhanced).enhance(saturation)
                 enhancements_applied.append(f"saturation:{saturation:.2f}")
             
             if sharpness != 1.0:
-                enhanced = ImageEnhance.Sharpness(enhanced).enhance(sharpness)
                 enhancements_applied.append(f"sharpness:{sharpness:.2f}")
             
+            if enhancements_applied:
+                enhanced = await run_blocking(enhance_pixels, enhanced, brightness, contrast, saturation, sharpness)
+            
             if denoise:
-                enhanced = enhanced.filter(ImageFilter.MedianFilter(size=3))
+                enhanced = await run_blocking(median_filter, enhanced)
                 enhancements_applied.append("denoise:median")
         
         # Prepare output
-        output_buffer = io.BytesIO()
-        
-        if output_format.lower() in ['jpg', 'jpeg']:
-            if enhanced.mode == 'RGBA':
-                white_bg = Image.new('RGBA', enhanced.size, (255, 255, 255, 255))
-                enhanced = Image.alpha_composite(white_bg, enhanced)
-            enhanced.convert('RGB').save(output_buffer, format='JPEG', quality=95)
-            media_type = "image/jpeg"
-        else:
-            enhanced.save(output_buffer, format='PNG', optimize=True)
-            media_type = "image/png"
-        
-        output_buffer.seek(0)
+        output_data, media_type = await run_blocking(encode_image, enhanced, output_format, compress_level, quality)
         
         # Calculate processing time
-        processing_time = time.time() - start_time
+        processing_ns = time.monotonic_ns() - start_ns
+        processing_time = processing_ns / 1e9
         
         # Update statistics
-        stats["total_processed"] += 1
-        stats["total_processing_time"] += processing_time
-        stats["average_processing_time"] = stats["total_processing_time"] / stats["total_processed"]
-        stats["model_usage"]["enhance"] = stats["model_usage"].get("enhance", 0) + 1
+        record_success("enhance", processing_ns)
         
         logger.info(f"✅ Enhanced in {processing_time:.2f}s — {', '.join(enhancements_applied)}")
         
-        return Response(
-            content=output_buffer.getvalue(),
-            media_type=media_type,
-            headers={
-                "X-Processing-Time": f"{processing_time:.2f}s",
-                "X-Enhancements": "; ".join(enhancements_applied),
-                "X-Original-Size": str(len(image_data)),
-                "X-Processed-Size": str(len(output_buffer.getvalue()))
-            }
-        )
+        headers = {
+            "X-Processing-Time": f"{processing_time:.2f}s",
+            "X-Enhancements": "; ".join(enhancements_applied),
+            "X-Original-Size": str(upload_size),
+            "X-Processed-Size": str(len(output_data))
+        }
+        if media_type == "image/png":
+            headers["X-PNG-Level"] = str(compress_level)
+        else:
+            headers["X-JPEG-Quality"] = str(quality)
+        if cache_key is not None:
+            response_cache.put(cache_key, output_data, media_type, headers)
+            headers["X-Cache"] = "MISS"
+        
+        return Response(content=output_data, media_type=media_type, headers=headers)
         
     except HTTPException:
         raise
     except Exception as e:
-        stats["total_errors"] += 1
+        record_error()
         logger.error(f"❌ Enhancement error: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -475,15 +729,17 @@ async def crop_image(
     height: int = Query(600, ge=10, le=8000, description="Target height in pixels"),
     x: Optional[int] = Query(None, ge=0, description="Crop start X position"),
     y: Optional[int] = Query(None, ge=0, description="Crop start Y position"),
-    auto_detect: bool = Query(False, description="Auto-detect important areas (faces, center of mass)")
+    auto_detect: bool = Query(False, description="Auto-detect important areas (faces, center of mass)"),
+    compress_level: int = Query(1, ge=0, le=9, description="PNG compression level (0-9, lower is faster)")
 ):
     """
     Crop and resize image with manual or AI auto-detection
     
     - **Manual mode**: Provide width, height, and optional x, y coordinates
     - **Auto-detect mode**: AI finds important areas (faces or center of mass)
+    - **compress_level**: PNG zlib compression level (0-9, default 1 favours speed)
     """
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
         # Validate file type
@@ -493,59 +749,34 @@ async def crop_image(
                 detail="Invalid file type. Please upload an image."
             )
         
-        # Read and validate image
-        image_data = await image.read()
-        if len(image_data) > 50 * 1024 * 1024:  # 50MB limit
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="File too large. Maximum size is 50MB."
-            )
+        # Read and validate image (size limit enforced by get_upload_size)
+        get_upload_size(image)
         
         logger.info(f"📐 Crop request: {width}x{height}, auto_detect={auto_detect}")
         
-        # Open image
-        img = Image.open(io.BytesIO(image_data))
-        
-        # Convert to RGB if needed
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
+        # Open image as RGB (transparent images are flattened onto white)
+        img = await run_blocking(open_rgb_on_white, image.file)
         
         original_width, original_height = img.size
         
         # Determine crop box
         if auto_detect:
-            # Try to detect faces using OpenCV (if available)
-            try:
-                import cv2
-                img_array = np.array(img)
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-                
-                # Load Haar Cascade for face detection
-                face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-                
-                if len(faces) > 0:
-                    # Use the first detected face as center
-                    (fx, fy, fw, fh) = faces[0]
-                    center_x = fx + fw // 2
-                    center_y = fy + fh // 2
-                    logger.info(f"✅ Face detected at ({center_x}, {center_y})")
-                else:
-                    # No face detected, use center of image
-                    center_x = original_width // 2
-                    center_y = original_height // 2
-                    logger.info("ℹ️  No face detected, using center of image")
-            except ImportError:
-                # OpenCV not available, use center of image
+            # Face detector loaded at startup (YuNet, or Haar cascade as fallback)
+            face = None
+            if face_detector is not None:
+                face = await run_blocking(face_detector.find_face, img)
+            
+            if face is not None:
+                # Use the detected face as center
+                (fx, fy, fw, fh) = face
+                center_x = fx + fw // 2
+                center_y = fy + fh // 2
+                logger.info(f"✅ Face detected at ({center_x}, {center_y})")
+            else:
+                # No face detected, use center of image
                 center_x = original_width // 2
                 center_y = original_height // 2
-                logger.info("ℹ️  OpenCV not available, using center of image")
+                logger.info("ℹ️  No face detected, using center of image")
             
             # Calculate crop box centered on the detected point
             x = max(0, center_x - width // 2)
@@ -585,45 +816,42 @@ async def crop_image(
                 new_width = original_width
                 new_height = int(new_width / aspect_ratio)
             
-            img = img.resize((max(width, new_width), max(height, new_height)), Image.Resampling.LANCZOS)
+            img = await run_blocking(img.resize, (max(width, new_width), max(height, new_height)), Image.Resampling.LANCZOS)
             original_width, original_height = img.size
             x = max(0, (original_width - width) // 2)
             y = max(0, (original_height - height) // 2)
             crop_box = (x, y, x + width, y + height)
         
-        cropped = img.crop(crop_box)
+        cropped = await run_blocking(img.crop, crop_box)
         
-        # Save to buffer
-        output_buffer = io.BytesIO()
-        cropped.save(output_buffer, format='PNG', optimize=True)
-        output_buffer.seek(0)
+        # Encode the result
+        output_data, _ = await run_blocking(encode_image, cropped, "png", compress_level)
         
         # Calculate processing time
-        processing_time = time.time() - start_time
+        processing_ns = time.monotonic_ns() - start_ns
+        processing_time = processing_ns / 1e9
         
         # Update statistics
-        stats["total_processed"] += 1
-        stats["total_processing_time"] += processing_time
-        stats["average_processing_time"] = stats["total_processing_time"] / stats["total_processed"]
-        stats["model_usage"]["crop"] = stats["model_usage"].get("crop", 0) + 1
+        record_success("crop", processing_ns)
         
         logger.info(f"✅ Cropped to {width}x{height} in {processing_time:.2f}s")
         
         return Response(
-            content=output_buffer.getvalue(),
+            content=output_data,
             media_type="image/png",
             headers={
                 "X-Processing-Time": f"{processing_time:.2f}s",
                 "X-Crop-Box": f"{x},{y},{x+width},{y+height}",
                 "X-Original-Size": f"{original_width}x{original_height}",
-                "X-Cropped-Size": f"{width}x{height}"
+                "X-Cropped-Size": f"{width}x{height}",
+                "X-PNG-Level": str(compress_level)
             }
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        stats["total_errors"] += 1
+        record_error()
         logger.error(f"❌ Crop error: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -632,10 +860,18 @@ async def crop_image(
 
 
 @app.get("/stats")
-async def get_stats():
+async def get_stats() -> dict:
     """Get service statistics"""
+    with stats_lock:
+        total_processed, total_errors, total_processing_ns = stat_counts
+        usage = dict(model_usage)
+    total_processing_time = total_processing_ns / 1e9
     return {
-        **stats,
+        "total_processed": total_processed,
+        "total_errors": total_errors,
+        "total_processing_time": total_processing_time,
+        "average_processing_time": total_processing_time / total_processed if total_processed else 0.0,
+        "model_usage": usage,
         "status": "healthy" if rembg_sessions else "unhealthy",
         "available_models": list(rembg_sessions.keys()),
         "memory_usage": get_memory_usage()
@@ -647,5 +883,10 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=5000,
         reload=False,
-        log_level="info"
+        log_level="info",
+        # Single worker: models are loaded once and ORT uses all cores per inference
+        workers=1,
+        loop="uvloop",
+        # C HTTP parser (shipped with uvicorn[standard]) for the multi-MB upload bodies
+        http="httptools"
     )
@@ -0,0 +1,137 @@
+"""
+Dynamic micro-batching for rembg mask prediction
+Requests arriving within a short window share a single ONNX forward pass
+"""
+
+import os
+import asyncio
+import logging
+
+import numpy as np
+from PIL import Image
+
+from sessions import MODEL_INPUTS
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = int(os.getenv("BATCH_MAX_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+
+class MaskBatcher:
+    """Coalesces concurrent mask predictions for one model into batched runs"""
+
+    def __init__(self, model_name: str, session, executor=None):
+        self.model_name = model_name
+        self.session = session
+        self.executor = executor
+        mean, std, self.size = MODEL_INPUTS[model_name]
+        self.mean = np.array(mean, dtype=np.float32)
+        self.std = np.array(std, dtype=np.float32)
+
+        model_input = session.inner_session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exported graphs with a fixed batch dimension can only run one image at a time
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        """Start the background batching loop"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background batching loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, image: Image.Image) -> Image.Image:
+        """Queue an image and wait for its predicted mask (mode 'L', image size)"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def _collect(self):
+        """Wait for the first job, then gather more until the batch or window is full"""
+        loop = asyncio.get_running_loop()
+        jobs = [await self._queue.get()]
+        if not self.dynamic_batch:
+            # A fixed batch dimension runs one image per pass: waiting or queueing
+            # others behind it would only delay this result
+            return jobs
+
+        deadline = loop.time() + MAX_WAIT_MS / 1000
+
+        while len(jobs) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                jobs.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return jobs
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            jobs = await self._collect()
+            images = [image for image, _ in jobs]
+
+            try:
+                masks = await loop.run_in_executor(self.executor, self.predict_batch, images)
+            except Exception as e:
+                for _, future in jobs:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), mask in zip(jobs, masks):
+                if not future.done():
+                    future.set_result(mask)
+
+    def _preprocess(self, image: Image.Image, out: np.ndarray):
+        """Resize and normalize one image straight into its (3, H, W) slot of the batch"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        arr = np.asarray(image.resize(self.size, Image.Resampling.LANCZOS), dtype=np.float32)
+
+        # Same normalization as rembg, in float32 and without intermediate copies
+        arr /= max(arr.max(), 1e-6)
+        arr -= self.mean
+        arr /= self.std
+        out[...] = arr.transpose(2, 0, 1)
+
+    def predict_batch(self, images):
+        """Run the model over a list of images and return one mask per image"""
+        width, height = self.size
+        batch = np.empty((len(images), 3, height, width), dtype=np.float32)
+        for image, slot in zip(images, batch):
+            self._preprocess(image, slot)
+
+        run = self.session.inner_session.run
+        if self.dynamic_batch and len(images) > 1:
+            preds = run(None, {self.input_name: batch})[0][:, 0]
+            logger.debug(f"{self.model_name}: batched forward pass of {len(images)} images")
+        else:
+            preds = [run(None, {self.input_name: batch[i:i + 1]})[0][0, 0] for i in range(len(images))]
+
+        return [self._to_mask(pred, image.size) for pred, image in zip(preds, images)]
+
+    @staticmethod
+    def _to_mask(pred: np.ndarray, size) -> Image.Image:
+        """Scale a raw prediction to a 0-255 mask at the original image size"""
+        ma = np.max(pred)
+        mi = np.min(pred)
+        pred = (pred - mi) / (ma - mi)
+
+        mask = Image.fromarray((pred.clip(0, 1) * 255).astype("uint8"), mode="L")
+        return mask.resize(size, Image.Resampling.LANCZOS)
@@ -0,0 +1,16 @@
+"""
+Build-time compilation of the Numba pixel kernels
+Run during the image build so the on-disk kernel cache is ready before the first start
+"""
+
+import logging
+
+from kernels import warm_up
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    logger.info("Compiling pixel kernels...")
+    warm_up()
+    logger.info("✅ Pixel kernels compiled!")
@@ -0,0 +1,103 @@
+"""
+Face detection for smart crop
+OpenCV's YuNet detector (a small ONNX CNN) loaded once at startup,
+with a Haar cascade (also loaded once) as fallback
+"""
+
+import os
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fetched at image build time (see Dockerfile); smart crop falls back to Haar without it
+FACE_DETECTOR_MODEL = os.getenv(
+    "FACE_DETECTOR_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "face_detection_yunet_2023mar.onnx")
+)
+
+# Longest side (px) the detector sees; cropping only needs the face position
+DETECT_MAX_SIZE = int(os.getenv("FACE_DETECT_MAX_SIZE", "640"))
+
+
+class FaceDetector:
+    """Finds the most confident face in an image with cv2.FaceDetectorYN"""
+
+    def __init__(self, model_path: str = FACE_DETECTOR_MODEL):
+        import cv2
+
+        self.cv2 = cv2
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold=0.7)
+        # The detector keeps its input size as state; requests run on the thread pool
+        self.lock = threading.Lock()
+
+    def find_face(self, image) -> Optional[tuple]:
+        """Return (x, y, w, h) of the best face in an RGB image or array, or None"""
+        image = np.asarray(image)
+        height, width = image.shape[:2]
+        scale = min(1.0, DETECT_MAX_SIZE / max(height, width))
+
+        bgr = self.cv2.cvtColor(image, self.cv2.COLOR_RGB2BGR)
+        if scale < 1.0:
+            bgr = self.cv2.resize(
+                bgr, (max(1, round(width * scale)), max(1, round(height * scale))),
+                interpolation=self.cv2.INTER_AREA
+            )
+
+        with self.lock:
+            self.detector.setInputSize((bgr.shape[1], bgr.shape[0]))
+            _, faces = self.detector.detect(bgr)
+        if faces is None or len(faces) == 0:
+            return None
+
+        # Rows are [x, y, w, h, 5 landmark pairs, score]
+        best = faces[np.argmax(faces[:, -1])]
+        return tuple(int(round(v / scale)) for v in best[:4])
+
+
+class HaarFaceDetector:
+    """Finds a frontal face with OpenCV's Haar cascade (parsed once, not per request)"""
+
+    def __init__(self):
+        import cv2
+
+        self.cv2 = cv2
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # A shared cascade is not safe to run from several pool threads at once
+        self.lock = threading.Lock()
+
+    def find_face(self, image) -> Optional[tuple]:
+        """Return (x, y, w, h) of the first face in an RGB image or array, or None"""
+        gray = self.cv2.cvtColor(np.asarray(image), self.cv2.COLOR_RGB2GRAY)
+        with self.lock:
+            faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+        if len(faces) == 0:
+            return None
+        return tuple(int(v) for v in faces[0])
+
+
+def load_face_detector():
+    """
+    Create the best available face detector
+
+    YuNet when its model file is present, otherwise the Haar cascade;
+    None when OpenCV is not installed at all.
+    """
+    if os.path.exists(FACE_DETECTOR_MODEL):
+        try:
+            return FaceDetector()
+        except Exception as e:
+            logger.warning(f"⚠️  YuNet face detector unavailable: {e}")
+    else:
+        logger.warning(f"⚠️  Face detector model not found at {FACE_DETECTOR_MODEL}")
+
+    try:
+        detector = HaarFaceDetector()
+        logger.info("Using Haar cascade face detection")
+        return detector
+    except (ImportError, AttributeError) as e:
+        logger.warning(f"⚠️  OpenCV face detection unavailable: {e}")
+        return None
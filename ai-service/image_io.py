@@ -0,0 +1,107 @@
+"""
+Image decoding/encoding helpers
+Blocking codec work the endpoints run on the image thread pool; PNG output goes
+through OpenCV's encoder when it is installed, which is faster than PIL's at the
+same zlib level, and JPEG output is encoded by libjpeg-turbo straight from the
+pixel array (simplejpeg) when available. Encoders take PIL images or (H, W, 3|4)
+RGB/RGBA arrays and return the encoder's own buffer, so the response body is
+never copied into a new bytes object.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from kernels import flatten_on_white
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+
+def read_format(file_obj) -> str:
+    """Format of an uploaded image from its header, without decoding or converting it"""
+    image_format = Image.open(file_obj).format
+    file_obj.seek(0)
+    return image_format
+
+
+def decode_image(file_obj, exif_transpose: bool = False, max_size: int = None):
+    """
+    Open an uploaded image as RGB/RGBA, returning (image, format read from the header)
+
+    Other modes are converted to RGB. With exif_transpose the EXIF orientation is
+    applied in place, which may decode the pixels; otherwise RGB/RGBA images stay
+    lazily loaded.
+    With max_size, JPEGs larger than that are decoded with libjpeg-turbo's DCT
+    scaling (1/2, 1/4, 1/8) to the smallest size still covering max_size, so the
+    full-resolution pixels are never produced.
+    """
+    image = Image.open(file_obj)
+    image_format = image.format
+    if max_size and image_format == 'JPEG' and max(image.size) > max_size:
+        scale = max_size / max(image.size)
+        image.draft('RGB', (max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    if exif_transpose:
+        # In place: without an Orientation tag this is then a no-op instead of a full copy
+        ImageOps.exif_transpose(image, in_place=True)
+    return image, image_format
+
+
+def encode_png(image, compress_level: int = 1) -> memoryview:
+    """Encode an image as PNG with the given zlib level (0-9)"""
+    if cv2 is not None and (isinstance(image, np.ndarray) or image.mode in ('RGB', 'RGBA')):
+        pixels = np.asarray(image)
+        conversion = cv2.COLOR_RGB2BGR if pixels.shape[2] == 3 else cv2.COLOR_RGBA2BGRA
+        ok, encoded = cv2.imencode(
+            '.png',
+            cv2.cvtColor(pixels, conversion),
+            [cv2.IMWRITE_PNG_COMPRESSION, compress_level]
+        )
+        if ok:
+            # imencode returns an exactly sized (N, 1) array; expose it as flat bytes
+            return encoded.reshape(-1).data
+
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, format='PNG', compress_level=compress_level)
+    return output_buffer.getbuffer()
+
+
+def encode_jpeg(image, quality: int = 85):
+    """Encode an image as JPEG (4:2:0), flattening transparency onto white"""
+    if isinstance(image, Image.Image) and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    pixels = np.asarray(image)
+    rgb = flatten_on_white(pixels) if pixels.shape[2] == 4 else pixels
+
+    if simplejpeg is not None:
+        # Encodes the array directly, without building a PIL image for the flattened pixels
+        return simplejpeg.encode_jpeg(rgb, quality=quality, colorspace='RGB', colorsubsampling='420')
+
+    output_buffer = io.BytesIO()
+    Image.fromarray(rgb, 'RGB').save(output_buffer, format='JPEG', quality=quality)
+    return output_buffer.getbuffer()
+
+
+def encode_image(image, output_format: str, compress_level: int = 1, quality: int = 85):
+    """
+    Encode a response image, returning (encoded data, media type)
+
+    JPEG output is flattened onto white first and written at the given quality;
+    anything else is written as PNG at compress_level.
+    """
+    if output_format.lower() in ['jpg', 'jpeg']:
+        return encode_jpeg(image, quality), "image/jpeg"
+
+    return encode_png(image, compress_level), "image/png"
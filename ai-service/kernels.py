@@ -0,0 +1,251 @@
+"""
+Numba pixel kernels for the image endpoints
+Each kernel does in one pass over the pixels what PIL does in several;
+kernels release the GIL so they can run on the request thread pool
+"""
+
+import numpy as np
+from numba import njit, prange
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+@njit(parallel=True, fastmath=True, cache=True, nogil=True)
+def composite_white_rgb(rgba, out_rgb):
+    """Alpha-composite RGBA pixels over an opaque white background into RGB"""
+    height, width = rgba.shape[0], rgba.shape[1]
+    for y in prange(height):
+        for x in range(width):
+            a = np.int32(rgba[y, x, 3])
+            inv = 255 - a
+            for c in range(3):
+                # Rounded like PIL's alpha_composite
+                out_rgb[y, x, c] = (np.int32(rgba[y, x, c]) * a + 255 * inv + 127) // 255
+
+
+# Rows per parallel work item in the sharpening pass (plus a one-row halo each side)
+BLOCK_ROWS = 64
+
+
+def blend_lut(factor: float, degenerate=None) -> np.ndarray:
+    """
+    Lookup table for PIL's Image.blend(degenerate, image, factor) on one channel
+
+    PIL blends in float32, then clips and truncates. With a scalar degenerate value
+    the table is (256,); with degenerate=None it is (256, 256) indexed [degenerate, value].
+    """
+    value = np.arange(256, dtype=np.float32)
+    if degenerate is None:
+        degenerate = value[:, None]
+    v = np.float32(degenerate) + np.float32(factor) * (value - np.float32(degenerate))
+    return np.clip(v, 0, 255).astype(np.uint8)
+
+
+@njit(inline='always')
+def _luma(r, g, b):
+    """ITU-R 601-2 luma with PIL's fixed-point rounding"""
+    return (r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def luma_sum(src, lut):
+    """Sum of the luma of every pixel after mapping each channel through lut"""
+    height, width = src.shape[0], src.shape[1]
+    total = 0
+    for y in prange(height):
+        row = 0
+        for x in range(width):
+            row += _luma(np.int64(lut[src[y, x, 0]]), np.int64(lut[src[y, x, 1]]),
+                         np.int64(lut[src[y, x, 2]]))
+        total += row
+    return total
+
+
+@njit(inline='always')
+def _adjust_row(src, y, dst, lut_point, lut_color):
+    """Brightness/Contrast (per-channel table) then Color (luma-indexed table) for one row"""
+    for x in range(src.shape[1]):
+        r = lut_point[src[y, x, 0]]
+        g = lut_point[src[y, x, 1]]
+        b = lut_point[src[y, x, 2]]
+        lum = _luma(np.int32(r), np.int32(g), np.int32(b))
+        dst[x, 0] = lut_color[lum, r]
+        dst[x, 1] = lut_color[lum, g]
+        dst[x, 2] = lut_color[lum, b]
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def fused_enhance(src, out, lut_point, lut_color, lut_sharp, sharpen):
+    """
+    Brightness, Contrast, Color and Sharpness (ImageEnhance semantics) in one sweep
+
+    Each block of rows is adjusted into a small buffer (with a one-row halo) and
+    sharpened from there, so the source is read once. Sharpness blends against
+    PIL's SMOOTH filter and leaves the image border untouched, as PIL does.
+    Alpha is copied unchanged.
+    """
+    height, width, channels = src.shape
+    n_blocks = (height + BLOCK_ROWS - 1) // BLOCK_ROWS
+
+    for block in prange(n_blocks):
+        y0 = block * BLOCK_ROWS
+        y1 = min(height, y0 + BLOCK_ROWS)
+        h0 = max(0, y0 - 1)
+        h1 = min(height, y1 + 1)
+
+        rows = np.empty((h1 - h0, width, 3), dtype=np.uint8)
+        for y in range(h0, h1):
+            _adjust_row(src, y, rows[y - h0], lut_point, lut_color)
+
+        for y in range(y0, y1):
+            cur = rows[y - h0]
+            out[y, :, :3] = cur
+            if sharpen and 0 < y < height - 1:
+                up = rows[y - h0 - 1]
+                down = rows[y - h0 + 1]
+                for x in range(1, width - 1):
+                    for c in range(3):
+                        # SMOOTH kernel: centre weight 5, neighbours 1, divided by 13 (rounded)
+                        total = 4 * np.int32(cur[x, c])
+                        for dx in range(-1, 2):
+                            total += np.int32(up[x + dx, c]) + np.int32(cur[x + dx, c]) \
+                                + np.int32(down[x + dx, c])
+                        out[y, x, c] = lut_sharp[(2 * total + 13) // 26, cur[x, c]]
+            if channels == 4:
+                out[y, :, 3] = src[y, :, 3]
+
+
+@njit(inline='always')
+def _sort3(a, b, c):
+    """Return three values as (low, middle, high)"""
+    if a > b:
+        a, b = b, a
+    if b > c:
+        b, c = c, b
+    if a > b:
+        a, b = b, a
+    return a, b, c
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def median3x3(src, out):
+    """
+    3x3 median of every channel, matching PIL's MedianFilter(3) (edges replicated)
+
+    Each column triple is sorted once and reused by the three windows that share it;
+    the median of the 9 values is then med3(max of lows, med3 of middles, min of highs).
+    """
+    height, width, channels = src.shape
+    for y in prange(height):
+        up = max(y - 1, 0)
+        down = min(y + 1, height - 1)
+        for c in range(channels):
+            lo0, mid0, hi0 = _sort3(src[up, 0, c], src[y, 0, c], src[down, 0, c])
+            lo1, mid1, hi1 = lo0, mid0, hi0
+            for x in range(width):
+                nx = min(x + 1, width - 1)
+                lo2, mid2, hi2 = _sort3(src[up, nx, c], src[y, nx, c], src[down, nx, c])
+                lo = max(lo0, max(lo1, lo2))
+                hi = min(hi0, min(hi1, hi2))
+                _, mid, _ = _sort3(mid0, mid1, mid2)
+                _, med, _ = _sort3(lo, mid, hi)
+                out[y, x, c] = med
+                lo0, mid0, hi0 = lo1, mid1, hi1
+                lo1, mid1, hi1 = lo2, mid2, hi2
+
+
+def mean_luma(image, brightness: float = 1.0) -> float:
+    """Mean of the 'L' channel (after a brightness factor) without building the L image"""
+    arr = np.asarray(image)
+    return luma_sum(arr, blend_lut(brightness, 0)) / (arr.shape[0] * arr.shape[1])
+
+
+def enhance_pixels(src: np.ndarray, brightness: float = 1.0, contrast: float = 1.0,
+                   saturation: float = 1.0, sharpness: float = 1.0,
+                   luma: float = None) -> np.ndarray:
+    """
+    Apply the ImageEnhance chain to (H, W, 3|4) RGB/RGBA pixels with a single kernel launch
+
+    luma is the already known mean_luma() of the brightness-adjusted image, if any;
+    it saves the extra pass over the pixels that contrast otherwise needs.
+    """
+    lut_point = blend_lut(brightness, 0)
+    if contrast != 1.0:
+        # Contrast blends towards the mean grey level of the brightness-adjusted image
+        if luma is None:
+            luma = mean_luma(src, brightness)
+        lut_point = blend_lut(contrast, int(luma + 0.5))[lut_point]
+
+    out = np.empty_like(src)
+    fused_enhance(
+        src, out, lut_point, blend_lut(saturation), blend_lut(sharpness), sharpness != 1.0
+    )
+    return out
+
+
+def median_filter(src: np.ndarray) -> np.ndarray:
+    """
+    Denoise (H, W, 3|4) pixels with a 3x3 median (same result as ImageFilter.MedianFilter(3))
+
+    OpenCV's SIMD medianBlur (also edge-replicating) is used when installed,
+    the median3x3 kernel otherwise.
+    """
+    if cv2 is not None:
+        return cv2.medianBlur(src, 3)
+
+    out = np.empty_like(src)
+    median3x3(src, out)
+    return out
+
+
+def flatten_on_white(image) -> np.ndarray:
+    """Flatten an RGBA image (or (H, W, 4) array) onto white, returning an (H, W, 3) uint8 array"""
+    rgba = np.asarray(image)
+    out_rgb = np.empty((rgba.shape[0], rgba.shape[1], 3), dtype=np.uint8)
+    composite_white_rgb(rgba, out_rgb)
+    return out_rgb
+
+
+def composite_on_white(image: Image.Image) -> Image.Image:
+    """Flatten an RGBA image onto white, returning an RGB image"""
+    return Image.fromarray(flatten_on_white(image), 'RGB')
+
+
+def cutout(image: Image.Image, mask: Image.Image) -> Image.Image:
+    """
+    Apply a mask to an image as rembg's naive cutout does, returning RGBA
+
+    Every band (alpha included) is scaled by mask/255 with PIL's paste rounding.
+    RGB images are not converted to RGBA first: their implicit opaque alpha
+    scales to the mask itself.
+    """
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    src = np.asarray(image, dtype=np.uint32)
+    mask_arr = np.asarray(mask)
+
+    out = np.empty((src.shape[0], src.shape[1], 4), dtype=np.uint8)
+    bands = src.shape[2]
+    weighted = src * mask_arr[..., None].astype(np.uint32) + 128
+    out[..., :bands] = ((weighted >> 8) + weighted) >> 8
+    if bands == 3:
+        out[..., 3] = mask_arr
+    return Image.fromarray(out, 'RGBA')
+
+
+def warm_up():
+    """Compile the kernels ahead of the first request"""
+    composite_on_white(Image.new('RGBA', (8, 8), (0, 0, 0, 0)))
+    # JPEG output of /enhance flattens the writable arrays its steps return
+    flatten_on_white(np.empty((8, 8, 4), np.uint8))
+    for mode in ('RGB', 'RGBA'):
+        # Compiled for the read-only arrays PIL images expose, as the endpoints pass them
+        src = np.asarray(Image.new(mode, (8, 8)))
+        enhance_pixels(src, 1.1, 1.1, 1.1, 1.1)
+        # Fallback median: it filters the decoded upload or enhance_pixels' writable output
+        median3x3(src, np.empty_like(src))
+        median3x3(src.copy(), np.empty_like(src))
@@ -0,0 +1,149 @@
+"""
+Alpha matting as an ONNX graph
+Trimap construction and a guided-filter refinement run inside ONNX Runtime
+instead of rembg's Python closed-form matting
+"""
+
+import os
+import logging
+
+import numpy as np
+import onnxruntime as ort
+from onnx import TensorProto, helper
+from PIL import Image
+from rembg.bg import post_process
+
+from sessions import INTRA_OP_THREADS, get_execution_providers, with_cpu_fallback
+
+logger = logging.getLogger(__name__)
+
+# Guided filter window radius (px) and regularization; larger values give softer edges
+GUIDED_RADIUS = int(os.getenv("MATTING_GUIDED_RADIUS", "8"))
+GUIDED_EPS = float(os.getenv("MATTING_GUIDED_EPS", "1e-3"))
+
+
+def build_matting_graph(foreground_threshold: int, background_threshold: int,
+                        erode_size: int, radius: int = GUIDED_RADIUS, eps: float = GUIDED_EPS):
+    """
+    Build the matting model: (image [1,3,H,W], mask [1,1,H,W], both 0-1) -> alpha [1,1,H,W]
+
+    Erosion of the sure foreground/background regions is a MaxPool over the negated
+    masks, with the same borders as rembg's binary_erosion (background extends past
+    the image edge, foreground does not), and the unknown band takes the mask refined
+    by a guided filter on the image luma, with box filters as AveragePool.
+    """
+    nodes = []
+    initializers = [
+        helper.make_tensor("fg_threshold", TensorProto.FLOAT, [], [foreground_threshold / 255]),
+        helper.make_tensor("bg_threshold", TensorProto.FLOAT, [], [background_threshold / 255]),
+        helper.make_tensor("luma_weights", TensorProto.FLOAT, [1, 3, 1, 1], [0.299, 0.587, 0.114]),
+        helper.make_tensor("eps", TensorProto.FLOAT, [], [eps]),
+        helper.make_tensor("zero", TensorProto.FLOAT, [], [0.0]),
+        helper.make_tensor("one", TensorProto.FLOAT, [], [1.0]),
+        # Pad order is (N, C, H, W) begins then ends, matching the MaxPool pads below
+        helper.make_tensor("erode_pads", TensorProto.INT64, [8], [
+            0, 0, erode_size // 2, erode_size // 2, 0, 0, (erode_size - 1) // 2, (erode_size - 1) // 2
+        ])
+    ]
+
+    def node(op, inputs, output, **attrs):
+        nodes.append(helper.make_node(op, inputs, [output], **attrs))
+        return output
+
+    def erode(region, name, border_value):
+        # Binary erosion = NOT dilate(NOT region); MaxPool ignores padding like border_value=1
+        if erode_size <= 0:
+            return node("Cast", [region], name, to=TensorProto.BOOL)
+        inverted = node("Sub", ["one", region], f"{name}_inv")
+        pads = [erode_size // 2, erode_size // 2, (erode_size - 1) // 2, (erode_size - 1) // 2]
+        if border_value == 0:
+            # Outside pixels count as not in the region: pad the negated mask with ones
+            inverted = node("Pad", [inverted, "erode_pads", "one"], f"{name}_padded", mode="constant")
+            pads = [0, 0, 0, 0]
+        grown = node("MaxPool", [inverted], f"{name}_grown",
+                     kernel_shape=[erode_size, erode_size], pads=pads)
+        return node("Less", [grown, "one"], name)
+
+    def box(x, name):
+        size = 2 * radius + 1
+        return node("AveragePool", [x], name, kernel_shape=[size, size],
+                    pads=[radius] * 4, count_include_pad=0)
+
+    # Trimap: eroded sure-foreground and sure-background regions
+    fg = node("Cast", [node("Greater", ["mask", "fg_threshold"], "fg_bool")], "fg", to=TensorProto.FLOAT)
+    bg = node("Cast", [node("Less", ["mask", "bg_threshold"], "bg_bool")], "bg", to=TensorProto.FLOAT)
+    sure_fg = erode(fg, "sure_fg", border_value=0)
+    sure_bg = erode(bg, "sure_bg", border_value=1)
+
+    # Guided filter (He et al.) of the mask with the grey image as guide
+    guide = node("Conv", ["image", "luma_weights"], "guide")
+    mean_i = box(guide, "mean_i")
+    mean_p = box("mask", "mean_p")
+    corr_ip = box(node("Mul", [guide, "mask"], "ip"), "corr_ip")
+    corr_ii = box(node("Mul", [guide, guide], "ii"), "corr_ii")
+    cov_ip = node("Sub", [corr_ip, node("Mul", [mean_i, mean_p], "mean_i_p")], "cov_ip")
+    var_i = node("Sub", [corr_ii, node("Mul", [mean_i, mean_i], "mean_i_sq")], "var_i")
+    a = node("Div", [cov_ip, node("Add", [var_i, "eps"], "var_i_eps")], "a")
+    b = node("Sub", [mean_p, node("Mul", [a, mean_i], "a_mean_i")], "b")
+    refined = node("Add", [node("Mul", [box(a, "mean_a"), guide], "a_i"), box(b, "mean_b")], "refined")
+    refined = node("Clip", [refined, "zero", "one"], "refined_clipped")
+
+    alpha = node("Where", [sure_bg, "zero", refined], "alpha_bg")
+    node("Where", [sure_fg, "one", alpha], "alpha")
+
+    graph = helper.make_graph(
+        nodes,
+        "guided_matting",
+        [
+            helper.make_tensor_value_info("image", TensorProto.FLOAT, [1, 3, "height", "width"]),
+            helper.make_tensor_value_info("mask", TensorProto.FLOAT, [1, 1, "height", "width"])
+        ],
+        [helper.make_tensor_value_info("alpha", TensorProto.FLOAT, [1, 1, "height", "width"])],
+        initializers
+    )
+    # Pin the IR version so the graph loads on older ONNX Runtime builds too
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8)
+
+
+class GuidedMatting:
+    """Alpha matting cutout backed by an ONNX Runtime session"""
+
+    def __init__(self, foreground_threshold: int = 240, background_threshold: int = 10,
+                 erode_size: int = 10):
+        model = build_matting_graph(foreground_threshold, background_threshold, erode_size)
+
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = INTRA_OP_THREADS
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Image sizes vary per request: TensorRT would rebuild its engine and an exhaustive
+        # cuDNN search would rerun for every new size, so use plain CUDA (or CPU) here
+        providers = []
+        for provider in get_execution_providers():
+            name = provider[0] if isinstance(provider, tuple) else provider
+            if name == "TensorrtExecutionProvider":
+                continue
+            providers.append(name if name == "CUDAExecutionProvider" else provider)
+        self.session = with_cpu_fallback(
+            lambda providers: ort.InferenceSession(
+                model.SerializeToString(), sess_options=sess_options, providers=providers
+            ),
+            providers,
+            "Alpha matting"
+        )
+        logger.info(f"Alpha matting running on {self.session.get_providers()}")
+
+    def cutout(self, image: Image.Image, mask: Image.Image, post_process_mask: bool = False) -> Image.Image:
+        """Refine the mask against the image and return the RGBA cutout"""
+        if post_process_mask:
+            mask = Image.fromarray(post_process(np.array(mask)))
+
+        rgb = image if image.mode == 'RGB' else image.convert('RGB')
+        image_input = np.asarray(rgb, dtype=np.float32).transpose(2, 0, 1)[None] / 255
+        mask_input = np.asarray(mask, dtype=np.float32)[None, None] / 255
+
+        alpha = self.session.run(None, {"image": image_input, "mask": mask_input})[0][0, 0]
+        alpha = Image.fromarray((alpha * 255 + 0.5).astype(np.uint8), 'L')
+
+        result = rgb.convert('RGBA')
+        result.putalpha(alpha)
+        return result
@@ -0,0 +1,58 @@
+"""
+Response cache for repeated uploads
+Encoded responses keyed by a digest of the uploaded bytes plus the request
+parameters, so retried or duplicate requests skip decoding, inference and encoding
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Entry and total size limits; RESPONSE_CACHE_SIZE=0 disables caching
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "128"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+def digest_upload(file_obj) -> bytes:
+    """BLAKE2b digest of an uploaded file, leaving it rewound for decoding"""
+    file_obj.seek(0)
+    digest = hashlib.file_digest(file_obj, hashlib.blake2b).digest()
+    file_obj.seek(0)
+    return digest
+
+
+class ResponseCache:
+    """LRU of (content, media type, headers), bounded by entry count and total bytes"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached entry for key (marking it recently used), or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, content, media_type: str, headers: dict):
+        """Store an encoded response, evicting the least recently used ones over the limits"""
+        size = memoryview(content).nbytes
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= memoryview(old[0]).nbytes
+            self.entries[key] = (content, media_type, dict(headers))
+            self.total_bytes += size
+
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= memoryview(evicted[0]).nbytes
@@ -0,0 +1,278 @@
+"""
+ONNX Runtime session factory for the rembg models
+Builds the inference sessions with hardware-specific execution providers
+instead of rembg's default CPU provider
+"""
+
+import os
+import logging
+
+import onnx
+import onnxruntime as ort
+from rembg.sessions import sessions_class
+
+logger = logging.getLogger(__name__)
+
+# Directory for compiled engines and other artifacts that survive restarts
+MODEL_CACHE_DIR = os.getenv(
+    "MODEL_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "cache")
+)
+TRT_CACHE_DIR = os.path.join(MODEL_CACHE_DIR, "trt")
+OPENVINO_CACHE_DIR = os.path.join(MODEL_CACHE_DIR, "openvino")
+
+# Normalization (mean, std) and native input size (width, height) of each model, as used by rembg
+MODEL_INPUTS = {
+    "u2net": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), (1024, 1024))
+}
+
+# One process owns the models; ORT parallelizes inside it instead of per-worker copies
+INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", str(os.cpu_count() or 1)))
+INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "2"))
+
+# Providers that compile the graph themselves and cannot serialize ORT's optimized model
+COMPILING_PROVIDERS = ("TensorrtExecutionProvider", "OpenVINOExecutionProvider")
+
+# INT8 weights give ~1.5-2x on CPU; GPU paths keep the original graph
+QUANTIZE_INT8 = os.getenv("QUANTIZE_INT8", "true").lower() == "true"
+
+# FP16 weights run on tensor cores on GPU hosts; CPUs gain nothing from them
+CONVERT_FP16 = os.getenv("CONVERT_FP16", "true").lower() == "true"
+
+
+class AcceleratedSessionMixin:
+    """rembg session backed by an externally built ONNX Runtime session"""
+
+    def __init__(self, model_name: str, inner_session: ort.InferenceSession):
+        # rembg's predict()/normalize() only rely on these two attributes
+        self.model_name = model_name
+        self.inner_session = inner_session
+
+
+def get_session_class(model_name: str):
+    """Find the rembg session class that implements the given model"""
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class
+    raise ValueError(f"Unknown rembg model '{model_name}'")
+
+
+def has_gpu() -> bool:
+    """Check whether ONNX Runtime can run on a CUDA device"""
+    return "CUDAExecutionProvider" in ort.get_available_providers()
+
+
+def get_execution_providers():
+    """
+    Select the execution providers for the current host
+
+    GPU hosts get TensorRT (FP16, engine cache on disk) with CUDA as fallback,
+    CPU-only hosts get OpenVINO when available. CPU is always the last resort.
+    """
+    available = ort.get_available_providers()
+    providers = []
+
+    if has_gpu():
+        if "TensorrtExecutionProvider" in available:
+            os.makedirs(TRT_CACHE_DIR, exist_ok=True)
+            providers.append(("TensorrtExecutionProvider", {
+                "trt_fp16_enable": True,
+                "trt_engine_cache_enable": True,
+                "trt_engine_cache_path": TRT_CACHE_DIR,
+                "trt_timing_cache_enable": True,
+                "trt_timing_cache_path": TRT_CACHE_DIR
+            }))
+        # Benchmark the cuDNN conv algorithms once per shape; input sizes are pinned, so it pays off
+        providers.append(("CUDAExecutionProvider", {"cudnn_conv_algo_search": "EXHAUSTIVE"}))
+    elif "OpenVINOExecutionProvider" in available:
+        os.makedirs(OPENVINO_CACHE_DIR, exist_ok=True)
+        # OpenVINO only runs FP32/ACCURACY on CPU (FP16 is rejected), so keep its default
+        providers.append(("OpenVINOExecutionProvider", {
+            "device_type": "CPU",
+            "cache_dir": OPENVINO_CACHE_DIR
+        }))
+
+    providers.append("CPUExecutionProvider")
+    return providers
+
+
+def build_cached_model(path: str, message: str, write) -> str:
+    """
+    Return the path of a derived model in the cache directory, creating it if missing
+
+    write(tmp_path) produces the file; it runs only on the first start.
+    """
+    if not os.path.exists(path):
+        logger.info(message)
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        write(tmp_path)
+        # Renamed into place only once complete: a crash mid-write must not leave a
+        # truncated file that every later start would try to load
+        os.replace(tmp_path, path)
+    return path
+
+
+def with_cpu_fallback(create, providers: list, label: str):
+    """
+    Build an ONNX Runtime session with create(providers), retrying on CPU alone
+    when an accelerated provider fails to initialize (bad options, driver issues)
+    instead of taking the service down
+    """
+    try:
+        return create(providers)
+    except Exception as e:
+        if providers == ["CPUExecutionProvider"]:
+            raise
+        provider_names = [p[0] if isinstance(p, tuple) else p for p in providers]
+        logger.warning(f"⚠️  {label} failed to start on {provider_names}: {e}; falling back to CPU")
+        return create(["CPUExecutionProvider"])
+
+
+def quantize_model(model_name: str, model_path: str) -> str:
+    """
+    Return the path of an INT8 (dynamic quantization) copy of the model
+
+    The quantized graph is written once to the cache directory and reused
+    on subsequent starts.
+    """
+    def write(tmp_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(
+            model_input=model_path,
+            model_output=tmp_path,
+            weight_type=QuantType.QInt8,
+            op_types_to_quantize=["MatMul", "Conv"]
+        )
+
+    return build_cached_model(
+        os.path.join(MODEL_CACHE_DIR, f"{model_name}.int8.onnx"),
+        f"Quantizing {model_name} to INT8...",
+        write
+    )
+
+
+def convert_fp16(model_name: str, model_path: str) -> str:
+    """
+    Return the path of an FP16 copy of the model for GPU execution
+
+    Inputs and outputs stay float32, so callers keep feeding float32 tensors;
+    the casts to and from FP16 are part of the graph.
+    """
+    def write(tmp_path):
+        from onnxruntime.transformers.float16 import convert_float_to_float16
+
+        onnx.save(convert_float_to_float16(onnx.load(model_path), keep_io_types=True), tmp_path)
+
+    return build_cached_model(
+        os.path.join(MODEL_CACHE_DIR, f"{model_name}.fp16.onnx"),
+        f"Converting {model_name} to FP16...",
+        write
+    )
+
+
+def get_session_options(model_path: str, providers: list):
+    """
+    Build session options that persist ORT's optimized graph across restarts
+
+    Threading is configured for a single model-owning process (see INTRA_OP_THREADS).
+    Returns the model path to load together with the options: the first start
+    optimizes and saves the graph, later starts load the saved graph directly.
+    """
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = INTRA_OP_THREADS
+    sess_options.inter_op_num_threads = INTER_OP_THREADS
+    sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    provider_names = [p[0] if isinstance(p, tuple) else p for p in providers]
+
+    if any(name in COMPILING_PROVIDERS for name in provider_names):
+        # TensorRT/OpenVINO keep their own engine caches (see provider options)
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return model_path, sess_options
+
+    # Optimized graphs are specific to the hardware and to the ORT release that fused them
+    device = "cuda" if "CUDAExecutionProvider" in provider_names else "cpu"
+    model_stem = os.path.splitext(os.path.basename(model_path))[0]
+    optimized_path = os.path.join(MODEL_CACHE_DIR, f"{model_stem}.{device}.ort{ort.__version__}.opt.onnx")
+
+    if os.path.exists(optimized_path):
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        return optimized_path, sess_options
+
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Written while the session builds; create_session() renames it into place afterwards
+    sess_options.optimized_model_filepath = f"{optimized_path}.tmp"
+    return model_path, sess_options
+
+
+def pin_input_dimensions(sess_options: ort.SessionOptions, model_path: str, size):
+    """
+    Fix the symbolic height/width of the image input to the model's native size
+
+    Kernel selection (and TensorRT engine building) then happens once instead of
+    per new shape. The batch dimension is left free for the request batcher.
+    """
+    model = onnx.load(model_path, load_external_data=False)
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    width, height = size
+
+    for axis, value in ((2, height), (3, width)):
+        if axis < len(dims) and dims[axis].dim_param:
+            sess_options.add_free_dimension_override_by_name(dims[axis].dim_param, value)
+
+
+def create_session(model_path: str, providers: list, input_size) -> ort.InferenceSession:
+    """
+    Create an inference session, loading or persisting ORT's optimized graph
+
+    A saved graph that fails to load (e.g. truncated by a crash) is deleted and
+    rebuilt from the original model instead of failing every later start.
+    """
+    session_path, sess_options = get_session_options(model_path, providers)
+    try:
+        pin_input_dimensions(sess_options, session_path, input_size)
+        session = ort.InferenceSession(session_path, sess_options=sess_options, providers=providers)
+    except Exception as e:
+        if session_path == model_path:
+            raise
+        logger.warning(f"⚠️  Discarding unusable optimized graph {session_path}: {e}")
+        os.remove(session_path)
+        return create_session(model_path, providers, input_size)
+
+    tmp_path = sess_options.optimized_model_filepath
+    if tmp_path:
+        # Published only once complete: a crash mid-write must not leave a truncated graph
+        os.replace(tmp_path, tmp_path[:-len(".tmp")])
+    return session
+
+
+def build_session(model_name: str):
+    """
+    Create a rembg-compatible session for the given model
+
+    The returned object can be passed to rembg's remove(session=...) as usual.
+    """
+    base_class = get_session_class(model_name)
+    model_path = str(base_class.download_models())
+    if has_gpu():
+        if CONVERT_FP16:
+            model_path = convert_fp16(model_name, model_path)
+    elif QUANTIZE_INT8:
+        model_path = quantize_model(model_name, model_path)
+
+    inner_session = with_cpu_fallback(
+        lambda providers: create_session(model_path, providers, MODEL_INPUTS[model_name][2]),
+        get_execution_providers(),
+        model_name
+    )
+    logger.info(f"{model_name} running on {inner_session.get_providers()}")
+
+    session_class = type(
+        f"Accelerated{base_class.__name__}",
+        (AcceleratedSessionMixin, base_class),
+        {}
+    )
+    return session_class(model_name, inner_session)